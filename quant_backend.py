@@ -1,89 +1,691 @@
 import numpy as np
 import pandas as pd
-from scipy import stats
+from scipy import stats, linalg
 from statsmodels.tsa.stattools import adfuller
-from statsmodels.tsa.vector_ar.vecm import coint_johansen
-from sklearn.decomposition import PCA
+from sklearn.decomposition import IncrementalPCA
 from sklearn.cluster import KMeans
 from sklearn.ensemble import RandomForestClassifier
-from filterpy.kalman import KalmanFilter
 from hmmlearn import hmm
-import json
+from numba import njit
+import orjson
+import asyncio
+import math
+import os
 import socket
+import struct
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import multiprocessing
 import threading
 import time
 
+@njit(cache=True)
+def _kalman_scalar_step(x0, x1, p00, p01, p10, p11, F, H, R, Q, z):
+    """Prédiction + mise à jour sur les composantes scalaires de l'état 2D"""
+    # Prédiction : x = F x, P = F P F^T + Q
+    y0 = F[0, 0] * x0 + F[0, 1] * x1
+    y1 = F[1, 0] * x0 + F[1, 1] * x1
+    a00 = F[0, 0] * p00 + F[0, 1] * p10
+    a01 = F[0, 0] * p01 + F[0, 1] * p11
+    a10 = F[1, 0] * p00 + F[1, 1] * p10
+    a11 = F[1, 0] * p01 + F[1, 1] * p11
+    p00 = a00 * F[0, 0] + a01 * F[0, 1] + Q[0, 0]
+    p01 = a00 * F[1, 0] + a01 * F[1, 1] + Q[0, 1]
+    p10 = a10 * F[0, 0] + a11 * F[0, 1] + Q[1, 0]
+    p11 = a10 * F[1, 0] + a11 * F[1, 1] + Q[1, 1]
+    
+    # Mise à jour : gain K = P H^T / S
+    h0 = H[0, 0]
+    h1 = H[0, 1]
+    r = R[0, 0]
+    ph0 = p00 * h0 + p01 * h1
+    ph1 = p10 * h0 + p11 * h1
+    s = h0 * ph0 + h1 * ph1 + r
+    k0 = ph0 / s
+    k1 = ph1 / s
+    innov = z - (h0 * y0 + h1 * y1)
+    x0 = y0 + k0 * innov
+    x1 = y1 + k1 * innov
+    
+    # Forme de Joseph : P = (I - K H) P (I - K H)^T + K R K^T
+    i00 = 1.0 - k0 * h0
+    i01 = -k0 * h1
+    i10 = -k1 * h0
+    i11 = 1.0 - k1 * h1
+    b00 = i00 * p00 + i01 * p10
+    b01 = i00 * p01 + i01 * p11
+    b10 = i10 * p00 + i11 * p10
+    b11 = i10 * p01 + i11 * p11
+    p00 = b00 * i00 + b01 * i01 + k0 * k0 * r
+    p01 = b00 * i10 + b01 * i11 + k0 * k1 * r
+    p10 = b10 * i00 + b11 * i01 + k1 * k0 * r
+    p11 = b10 * i10 + b11 * i11 + k1 * k1 * r
+    
+    return x0, x1, p00, p01, p10, p11
+
+@njit(cache=True)
+def kalman_step(x, P, F, H, R, Q, z):
+    """Prédiction + mise à jour du filtre de Kalman pour un état 2D et une mesure scalaire"""
+    x0, x1, p00, p01, p10, p11 = _kalman_scalar_step(
+        x[0], x[1], P[0, 0], P[0, 1], P[1, 0], P[1, 1], F, H, R, Q, z
+    )
+    x_new = np.empty(2)
+    x_new[0] = x0
+    x_new[1] = x1
+    P_new = np.empty((2, 2))
+    P_new[0, 0] = p00
+    P_new[0, 1] = p01
+    P_new[1, 0] = p10
+    P_new[1, 1] = p11
+    return x_new, P_new, x0, np.sqrt(p00)
+
+@njit('float64[:](float64[:], float64[:], float64[:, :], float64[:, :], float64[:, :], '
+      'float64[:, :], float64[:, :])', cache=True)
+def kalman_zscore_batch(spreads, x, P, F, H, R, Q):
+    """Z-scores de toute une série de spreads ; l'état (x, P) est mis à jour sur place"""
+    x0, x1 = x[0], x[1]
+    p00, p01, p10, p11 = P[0, 0], P[0, 1], P[1, 0], P[1, 1]
+    zscores = np.empty(spreads.shape[0])
+    for i in range(spreads.shape[0]):
+        z = spreads[i]
+        x0, x1, p00, p01, p10, p11 = _kalman_scalar_step(x0, x1, p00, p01, p10, p11, F, H, R, Q, z)
+        std = np.sqrt(p00)
+        zscores[i] = 0.0 if std == 0 else (z - x0) / std
+    x[0], x[1] = x0, x1
+    P[0, 0], P[0, 1], P[1, 0], P[1, 1] = p00, p01, p10, p11
+    return zscores
+
+@njit(cache=True)
+def hmm_filter(log_alpha, log_transmat, means, variances, returns):
+    """Filtrage avant en log-espace d'un HMM gaussien univarié, un rendement à la fois"""
+    n = log_alpha.shape[0]
+    prev = log_alpha.copy()
+    cur = np.empty(n)
+    for t in range(returns.shape[0]):
+        for j in range(n):
+            # logsumexp_i(alpha_i + log A_ij)
+            m = -np.inf
+            for i in range(n):
+                v = prev[i] + log_transmat[i, j]
+                if v > m:
+                    m = v
+            if m == -np.inf:
+                cur[j] = -np.inf
+                continue
+            acc = 0.0
+            for i in range(n):
+                acc += np.exp(prev[i] + log_transmat[i, j] - m)
+            d = returns[t] - means[j]
+            cur[j] = m + np.log(acc) - 0.5 * (np.log(2 * np.pi * variances[j]) + d * d / variances[j])
+            
+        # Normaliser pour garder la loi filtrée bornée
+        m = cur.max()
+        acc = 0.0
+        for j in range(n):
+            acc += np.exp(cur[j] - m)
+        for j in range(n):
+            prev[j] = cur[j] - m - np.log(acc)
+    return prev
+
+@njit(cache=True)
+def rf_proba(X, feats, thrs, left, right, leaf_val):
+    """Probabilité moyenne de la classe positive sur tous les arbres de la forêt"""
+    n_trees = feats.shape[0]
+    out = np.empty(X.shape[0])
+    for s in range(X.shape[0]):
+        acc = 0.0
+        for t in range(n_trees):
+            node = 0
+            while left[t, node] != -1:
+                if X[s, feats[t, node]] <= thrs[t, node]:
+                    node = left[t, node]
+                else:
+                    node = right[t, node]
+            acc += leaf_val[t, node]
+        out[s] = acc / n_trees
+    return out
+
+@njit(cache=True)
+def hjb_stop(returns, risk_aversion):
+    """Condition d'arrêt HJB simplifiée en une seule passe sur les log-rendements"""
+    n = returns.shape[0]
+    s = 0.0
+    s2 = 0.0
+    for i in range(n):
+        r = returns[i]
+        s += r
+        s2 += r * r
+    mean = s / n
+    var = s2 / n - mean * mean
+    return (mean - 0.5 * risk_aversion * var) < 0
+
+def adf_pvalue(spread):
+    """P-valeur du test ADF (fonction de module, exécutable dans un processus fils)"""
+    return adfuller(spread)[1]
+
+def warmup_jit():
+    """Compiler les noyaux Numba avec des données factices avant le premier paquet"""
+    kalman_step(np.zeros(2), np.eye(2), np.eye(2), np.array([[1., 0.]]),
+                np.array([[0.1]]), np.eye(2) * 0.01, 0.0)
+    hmm_filter(np.zeros(2), np.zeros((2, 2)), np.zeros(2), np.ones(2), np.zeros(1))
+    hmm_filter(np.zeros(2), np.zeros((2, 2)), np.zeros(2), np.ones(2), np.zeros(1, dtype=np.float32))
+    leaf = np.full((1, 1), -1, dtype=np.int64)
+    rf_proba(np.zeros((1, 1), dtype=np.float32), np.zeros((1, 1), dtype=np.int64),
+             np.zeros((1, 1)), leaf, leaf, np.zeros((1, 1)))
+    hjb_stop(np.zeros(1), 2.0)
+    hjb_stop(np.zeros(1, dtype=np.float32), 2.0)
+
+# Nombre de points conservés par symbole (les colonnes en allouent le double)
+HISTORY_CAPACITY = 4096
+
+# Conditionnement au-delà duquel les moments de Johansen sont jugés singuliers
+JOHANSEN_MAX_COND = 1e12
+
+# Messages JSON : un document par ligne, terminé par '\n' ; taille maximale
+# d'une ligne JSON comme de la charge utile d'une trame binaire
+MAX_MESSAGE_SIZE = 16 * 1024 * 1024
+
+# Trame binaire : en-tête (magic, n_prices, n_volumes, symbole, heure de la
+# dernière barre) suivi des float64 bruts
+FRAME_MAGIC = b'QBIN'
+FRAME_SYMBOL_SIZE = 20
+FRAME_HEADER = struct.Struct(f'<4sII{FRAME_SYMBOL_SIZE}sq')
+
+def encode_frame(symbol, bar_time, prices, volumes):
+    """Encoder un paquet (symbole, heure, prix et volumes) dans une trame binaire"""
+    name = symbol.encode()
+    if len(name) > FRAME_SYMBOL_SIZE:
+        raise ValueError(f"Symbole trop long pour une trame : {symbol}")
+    prices = np.ascontiguousarray(prices, dtype='<f8')
+    volumes = np.ascontiguousarray(volumes, dtype='<f8')
+    header = FRAME_HEADER.pack(FRAME_MAGIC, len(prices), len(volumes), name, bar_time)
+    return header + prices.tobytes() + volumes.tobytes()
+
+def decode_header(buf):
+    """Lire l'en-tête d'une trame : (n_prices, n_volumes, symbole, heure)"""
+    magic, n_prices, n_volumes, name, bar_time = FRAME_HEADER.unpack_from(buf)
+    if magic != FRAME_MAGIC:
+        raise ValueError("En-tête de trame invalide")
+    if 8 * (n_prices + n_volumes) > MAX_MESSAGE_SIZE:
+        raise ValueError(f"Trame trop grande : {n_prices} prix, {n_volumes} volumes")
+    return n_prices, n_volumes, name.rstrip(b'\0').decode(), bar_time
+
+def decode_payload(buf, n_prices, n_volumes, offset=0):
+    """Exposer les prix et volumes d'une trame comme vues NumPy, sans copie"""
+    prices = np.frombuffer(buf, dtype='<f8', count=n_prices, offset=offset)
+    volumes = np.frombuffer(buf, dtype='<f8', count=n_volumes, offset=offset + 8 * n_prices)
+    return {'prices': prices, 'volumes': volumes}
+
+def decode_frame(buf):
+    """Décoder une trame binaire complète sans copier les tableaux"""
+    n_prices, n_volumes, symbol, bar_time = decode_header(buf)
+    data = decode_payload(buf, n_prices, n_volumes, FRAME_HEADER.size)
+    data.update(symbol=symbol, time=bar_time)
+    return data
+
+# Réponse JSON à champs fixes, remplie directement en octets
+RESPONSE_TEMPLATE = (
+    b'{"zScore":%.6f,"isDirectionalRegime":%s,"mlProbability":%.6f,'
+    b'"kalmanSignal":%s,"hedgeSignal":%s,"correlation":%.6f,"optimalStopSignal":%s}'
+)
+JSON_BOOL = (b'false', b'true')
+
+class SymbolBuffer:
+    """Historique d'un symbole en colonnes NumPy préallouées
+    
+    Les colonnes font le double de la capacité et ne sont recompactées que
+    lorsqu'elles sont pleines : les fenêtres récentes sont toujours des vues
+    contiguës, sans copie. Prix et log-prix restent en float64 (Kalman,
+    moments, cointégration) ; volumes et log-rendements sont en float32.
+    """
+    def __init__(self, capacity=HISTORY_CAPACITY):
+        self.capacity = capacity
+        self.prices = np.empty(2 * capacity)
+        self.volumes = np.empty(2 * capacity, dtype=np.float32)
+        self.log_prices = np.empty(2 * capacity)
+        self.log_returns = np.empty(2 * capacity, dtype=np.float32)
+        self.head = 0
+        self.count = 0
+        self.total = 0
+        
+    def _reserve(self, n):
+        """Recompacter les colonnes si n nouveaux points ne tiennent plus"""
+        if self.head + n > len(self.prices):
+            keep = min(self.count, self.capacity - n)
+            start = self.head - keep
+            for column in (self.prices, self.volumes, self.log_prices, self.log_returns):
+                column[:keep] = column[start:self.head]
+            self.head = keep
+            self.count = keep
+            
+    def push(self, price, volume=np.nan):
+        """Ajouter un point et mettre à jour les colonnes dérivées"""
+        self._reserve(1)
+        head = self.head
+        log_price = math.log(price)
+        self.prices[head] = price
+        self.volumes[head] = volume
+        self.log_prices[head] = log_price
+        if self.count > 0:
+            self.log_returns[head] = log_price - self.log_prices[head - 1]
+        self.head += 1
+        self.count += 1
+        self.total += 1
+        
+    def extend(self, prices, volumes=None):
+        """Ajouter une série de points (remplissage initial)"""
+        prices = prices[-self.capacity:]
+        n = len(prices)
+        self._reserve(n)
+        head = self.head
+        end = head + n
+        self.prices[head:end] = prices
+        self.volumes[head:end] = np.nan if volumes is None else volumes[-n:]
+        np.log(self.prices[head:end], out=self.log_prices[head:end])
+        np.subtract(self.log_prices[head + 1:end], self.log_prices[head:end - 1],
+                    out=self.log_returns[head + 1:end])
+        if self.count > 0:
+            self.log_returns[head] = self.log_prices[head] - self.log_prices[head - 1]
+        self.head = end
+        self.count += n
+        self.total += n
+        
+    def recent(self, n):
+        """Vue sur les n derniers prix"""
+        n = min(n, self.count)
+        return self.prices[self.head - n:self.head]
+        
+    def recent_volumes(self, n):
+        """Vue sur les n derniers volumes"""
+        n = min(n, self.count)
+        return self.volumes[self.head - n:self.head]
+        
+    def recent_returns(self, n):
+        """Vue sur les n derniers log-rendements"""
+        n = max(min(n, self.count - 1), 0)
+        return self.log_returns[self.head - n:self.head]
+
 class QuantBackend:
-    def __init__(self):
+    def __init__(self, coint_refresh_s=5.0, hmm_refit_s=600.0, adf_submit=None,
+                 coint_window=HISTORY_CAPACITY):
         # Initialisation des modèles
-        self.kalman_filter = None
+        self._x = None
         self.hmm_model = None
-        self.pca = PCA(n_components=3)
+        self._hmm_log_alpha = None
+        self.pca = IncrementalPCA(n_components=3, batch_size=64)
+        self._pca_fitted = False
+        self._pca_pending = []
         self.kmeans = KMeans(n_clusters=3)
-        self.rf_classifier = RandomForestClassifier(n_estimators=100)
+        self.rf_classifier = RandomForestClassifier(n_estimators=100, n_jobs=1)
+        self._rf_fitted = False
+        self._feature_scratch = np.empty((20, 3), dtype=np.float32)
         
         # Initialisation du stockage des données
         self.price_history = {}
         self.regime_history = []
         self.correlation_matrix = None
         
+        # Un seul paquet traité à la fois : filtres, historiques, moments et
+        # tampons sont modifiés sur place
+        self._lock = threading.Lock()
+        
+        # Dernier paquet traité, pour ignorer les renvois identiques de MT5
+        self._last_input_key = None
+        self._last_response = None
+        
+        # Moments de Welford glissants pour le ratio de couverture, par paire ;
+        # recalculés en entier tous les `_h_refresh` appels
+        self._h = {}
+        self._h_refresh = 1000
+        
+        # Moments produits du test de Johansen incrémental, empilés dans une
+        # seule matrice pour v_t = [Δx_t, x_{t-1}, 1, Δx_{t-1}], sur les
+        # `coint_window` derniers niveaux (comme le test ADF) ; recalculés en
+        # entier toutes les `coint_window` mises à jour
+        self._coint_window = coint_window
+        self._coint_M = np.zeros((7, 7))
+        self._coint_rows = deque(maxlen=coint_window - 2)
+        self._coint_age = 0
+        self._coint_prev = deque(maxlen=2)
+        self._adf_every = 50
+        self._adf_countdown = 0
+        self._adf_pvalue = np.nan
+        self._adf_future = None
+        
+        # Soumission du test ADF hors du processus (voir MT5Server._submit_adf) ;
+        # sans elle, le test s'exécute sur le thread de cointégration
+        self._adf_submit = adf_submit
+        
+        # Arrêt des threads d'arrière-plan (voir close)
+        self._closed = threading.Event()
+        
+        # Cache de cointégration rafraîchi en arrière-plan, démarré au premier
+        # paquet de paires
+        self._coint_lock = threading.Lock()
+        self._coint_cache = {
+            'adf_pvalue': np.nan,
+            'johansen_trace': np.nan,
+            'johansen_max_eig': np.nan
+        }
+        self._coint_refresh_s = coint_refresh_s
+        self._coint_thread = None
+        
+        # Ajustement HMM en arrière-plan : le chemin critique dépose une
+        # demande et adopte le modèle prêt au tick suivant
+        self._hmm_lock = threading.Lock()
+        self._hmm_event = threading.Event()
+        self._hmm_request = None
+        self._hmm_ready = None
+        self._hmm_refit_s = hmm_refit_s
+        self._hmm_next_fit = 0.0
+        self._regime_ticks = 0
+        self._hmm_thread = threading.Thread(target=self._hmm_loop, daemon=True)
+        self._hmm_thread.start()
+        
     def initialize_kalman_filter(self, initial_state, initial_covariance):
-        """Initialiser le Filtre de Kalman pour l'estimation du spread"""
-        self.kalman_filter = KalmanFilter(dim_x=2, dim_z=1)
-        self.kalman_filter.x = initial_state
-        self.kalman_filter.P = initial_covariance
-        self.kalman_filter.H = np.array([[1., 0.]])
-        self.kalman_filter.R = 0.1
-        self.kalman_filter.Q = np.eye(2) * 0.01
+        """Initialiser le Filtre de Kalman pour l'estimation du spread
+        
+        L'état et la covariance sont copiés : le filtre les met à jour sur
+        place sans modifier les tableaux de l'appelant.
+        """
+        self._x0 = np.array(initial_state, dtype=np.float64).reshape(2)
+        self._P0 = np.array(initial_covariance, dtype=np.float64).reshape(2, 2)
+        self._x = self._x0.copy()
+        self._P = self._P0.copy()
+        self._F = np.eye(2)
+        self._H = np.array([[1., 0.]])
+        self._R = np.array([[0.1]])
+        self._Q = np.eye(2) * 0.01
         
+    def reset_kalman_filter(self):
+        """Ramener le filtre à son état initial, avant de rejouer un historique"""
+        if self._x is not None:
+            self._x = self._x0.copy()
+            self._P = self._P0.copy()
+            
     def calculate_zscore(self, spread):
         """Calculer le Z-score adaptatif en utilisant le Filtre de Kalman"""
-        if self.kalman_filter is None:
+        if self._x is None:
             return 0.0
             
-        self.kalman_filter.predict()
-        self.kalman_filter.update(spread)
-        
-        mean = self.kalman_filter.x[0]
-        std = np.sqrt(self.kalman_filter.P[0, 0])
+        self._x, self._P, mean, std = kalman_step(
+            self._x, self._P, self._F, self._H, self._R, self._Q, float(spread)
+        )
         
         if std == 0:
             return 0.0
             
         return (spread - mean) / std
         
-    def detect_cointegration(self, series1, series2):
-        """Effectuer les tests de cointégration"""
-        # Test ADF
-        adf_result = adfuller(series1 - series2)
+    def calculate_zscore_batch(self, spreads):
+        """Calculer les Z-scores d'une série de spreads en une seule boucle compilée
+        
+        Sert aux backtests et au rejeu de l'historique : l'état du filtre est
+        avancé comme après autant d'appels à calculate_zscore.
+        """
+        spreads = np.ascontiguousarray(spreads, dtype=np.float64)
+        if self._x is None:
+            return np.zeros(len(spreads))
+            
+        return kalman_zscore_batch(spreads, self._x, self._P, self._F, self._H, self._R, self._Q)
+        
+    @staticmethod
+    def _johansen_rows(levels):
+        """Construire les vecteurs v_t = [Δx_t, x_{t-1}, 1, Δx_{t-1}] à partir des niveaux"""
+        dx = np.diff(levels, axis=0)
+        rows = np.empty((len(levels) - 2, 7))
+        rows[:, 0:2] = dx[1:]
+        rows[:, 2:4] = levels[1:-1]
+        rows[:, 4] = 1.0
+        rows[:, 5:7] = dx[:-1]
+        return rows
+        
+    def _update_johansen(self, obs):
+        """Mise à jour de rang 1 des moments produits avec une nouvelle observation
+        
+        La ligne qui sort de la fenêtre est retirée des moments ; un recalcul
+        complet périodique borne la dérive numérique de ces retraits.
+        """
+        if len(self._coint_prev) == 2:
+            row = self._johansen_rows(np.vstack((self._coint_prev[0], self._coint_prev[1], obs)))[0]
+            if len(self._coint_rows) == self._coint_rows.maxlen:
+                oldest = self._coint_rows[0]
+                self._coint_M -= np.outer(oldest, oldest)
+            self._coint_rows.append(row)
+            self._coint_age += 1
+            if self._coint_age >= self._coint_window:
+                rows = np.array(self._coint_rows)
+                self._coint_M = rows.T @ rows
+                self._coint_age = 0
+            else:
+                self._coint_M += np.outer(row, row)
+        self._coint_prev.append(obs)
+        
+    def _johansen_stats(self):
+        """Statistiques de trace et de valeur propre maximale à partir des moments cumulés"""
+        M = self._coint_M
+        T = len(self._coint_rows)
         
-        # Test de Johansen
-        data = np.column_stack((series1, series2))
-        johansen_result = coint_johansen(data, det_order=0, k_ar_diff=1)
+        # Séries constantes ou colinéaires : moments de rang déficient, les
+        # statistiques ne sont pas définies
+        if T <= M.shape[0] or np.linalg.cond(M[4:, 4:]) > JOHANSEN_MAX_COND:
+            return np.nan, np.nan
+            
+        # Résidus des régressions sur [1, Δx_{t-1}] : S = M_aa - M_ab M_bb^-1 M_ba
+        S = (M[:4, :4] - M[:4, 4:] @ np.linalg.solve(M[4:, 4:], M[4:, :4])) / T
+        s00, s0k, skk = S[:2, :2], S[:2, 2:], S[2:, 2:]
+        if np.linalg.cond(s00) > JOHANSEN_MAX_COND or np.linalg.cond(skk) > JOHANSEN_MAX_COND:
+            return np.nan, np.nan
+            
+        # Problème aux valeurs propres généralisé 2x2 : S_k0 S_00^-1 S_0k v = λ S_kk v
+        eig = linalg.eigh(s0k.T @ np.linalg.solve(s00, s0k), skk, eigvals_only=True)[::-1]
+        
+        return -T * np.sum(np.log(1 - eig)), -T * np.log(1 - eig[0])
+        
+    def detect_cointegration(self, series1, series2, n_new=1):
+        """Effectuer les tests de cointégration
+        
+        Les deux tests portent sur les `_coint_window` derniers niveaux. Le
+        premier appel intègre toute cette fenêtre, les suivants uniquement les
+        `n_new` dernières observations. Le test ADF est lancé tous les
+        `_adf_every` appels : soumis via `adf_submit`, sa p-valeur est relevée
+        sans attendre et reste celle du dernier test terminé ; sinon il est
+        exécuté sur place.
+        """
+        # Test de Johansen incrémental
+        series1 = series1[-self._coint_window:]
+        series2 = series2[-self._coint_window:]
+        levels = np.column_stack((series1, series2)).astype(float)
+        if len(self._coint_prev) == 0 or n_new >= len(levels):
+            rows = self._johansen_rows(levels)
+            self._coint_M = rows.T @ rows
+            self._coint_rows.clear()
+            self._coint_rows.extend(rows)
+            self._coint_age = 0
+            self._coint_prev.clear()
+            self._coint_prev.extend(levels[-2:])
+        elif n_new > 0:
+            for obs in levels[-n_new:]:
+                self._update_johansen(obs)
+        johansen_trace, johansen_max_eig = self._johansen_stats()
+        
+        # Relever le test ADF en cours s'il est terminé
+        if self._adf_future is not None and self._adf_future.done():
+            try:
+                self._adf_pvalue = self._adf_future.result()
+            except Exception as e:
+                print(f"Erreur lors du test ADF: {str(e)}")
+            self._adf_future = None
+            
+        # Lancer un nouveau test ADF (entrées en float64)
+        if self._adf_future is None and self._adf_countdown <= 0:
+            spread = np.asarray(series1, dtype=np.float64) - np.asarray(series2, dtype=np.float64)
+            if self._adf_submit is not None:
+                self._adf_future = self._adf_submit(adf_pvalue, spread)
+            else:
+                try:
+                    self._adf_pvalue = adf_pvalue(spread)
+                except Exception as e:
+                    print(f"Erreur lors du test ADF: {str(e)}")
+            self._adf_countdown = self._adf_every
+        self._adf_countdown -= 1
         
         return {
-            'adf_pvalue': adf_result[1],
-            'johansen_trace': johansen_result.lr1[0],
-            'johansen_max_eig': johansen_result.lr2[0]
+            'adf_pvalue': self._adf_pvalue,
+            'johansen_trace': johansen_trace,
+            'johansen_max_eig': johansen_max_eig
         }
         
-    def detect_regime(self, price_data):
-        """Détecter le régime du marché en utilisant HMM"""
-        if len(self.regime_history) < 100:
-            return False
+    def _cointegration_loop(self):
+        """Rafraîchir périodiquement le cache de cointégration hors du chemin critique"""
+        seen = 0
+        sources = None
+        while not self._closed.wait(self._coint_refresh_s):
             
-        # Préparer les données pour HMM
-        returns = np.diff(np.log(price_data))
-        returns = returns.reshape(-1, 1)
+            with self._coint_lock:
+                pair1 = self.price_history.get('pair1')
+                pair2 = self.price_history.get('pair2')
+                if pair1 is None or pair2 is None or ((pair1, pair2) == sources and pair1.total == seen):
+                    continue
+                if (pair1, pair2) != sources:
+                    # Historique reconstruit : repartir d'un test complet
+                    sources = (pair1, pair2)
+                    self._coint_prev.clear()
+                    seen = 0
+                ticks = pair1.total
+                n = min(pair1.count, pair2.count)
+                series1 = pair1.recent(n).copy()
+                series2 = pair2.recent(n).copy()
+                
+            try:
+                result = self.detect_cointegration(series1, series2, min(ticks - seen, len(series1)))
+            except Exception as e:
+                print(f"Erreur lors du test de cointégration: {str(e)}")
+                continue
+            finally:
+                seen = ticks
+                
+            with self._coint_lock:
+                self._coint_cache = result
+                
+    def get_cointegration(self):
+        """Lire les derniers résultats de cointégration calculés en arrière-plan"""
+        with self._coint_lock:
+            return dict(self._coint_cache)
+            
+    def close(self):
+        """Arrêter les threads d'arrière-plan"""
+        self._closed.set()
+        self._hmm_event.set()
+        for thread in (self._coint_thread, self._hmm_thread):
+            if thread is not None:
+                thread.join()
+        if self._adf_future is not None:
+            self._adf_future.cancel()
+        
+    def _update_history(self, symbol, prices, volumes=None):
+        """Intégrer un paquet à l'historique d'un symbole
         
-        # Ajuster HMM s'il n'est pas déjà ajusté
-        if self.hmm_model is None:
-            self.hmm_model = hmm.GaussianHMM(n_components=2, covariance_type="full")
-            self.hmm_model.fit(returns)
+        Les paquets portent des barres clôturées, la plus ancienne en tête, et
+        une seule barre nouvelle : ils recouvrent l'historique sur tous leurs
+        points sauf le dernier, seul ajouté. Sinon (premier paquet, barres
+        manquées, fenêtre inversée), l'historique est reconstruit à partir du
+        paquet. Renvoie l'historique et True s'il a été reconstruit.
+        """
+        prices = np.asarray(prices, dtype=np.float64)
+        history = self.price_history.get(symbol)
+        if history is not None and np.array_equal(history.recent(len(prices) - 1), prices[:-1]):
+            if volumes is None:
+                history.push(prices[-1])
+            else:
+                history.push(prices[-1], volumes[-1])
+            return history, False
+            
+        history = self.price_history[symbol] = SymbolBuffer()
+        history.extend(prices, volumes)
+        return history, True
+        
+    @staticmethod
+    def _fit_hmm(returns):
+        """Ajuster un HMM et filtrer l'historique ; renvoie le modèle, ses
+        paramètres mis en cache et la loi filtrée au dernier rendement"""
+        returns = np.asarray(returns, dtype=np.float64)
+        model = hmm.GaussianHMM(n_components=2, covariance_type="full")
+        model.fit(returns.reshape(-1, 1))
+        log_transmat = np.log(model.transmat_)
+        means = model.means_[:, 0].copy()
+        variances = model.covars_[:, 0, 0].copy()
+        
+        d = returns[0] - means
+        log_alpha = np.log(model.startprob_) - 0.5 * (np.log(2 * np.pi * variances) + d * d / variances)
+        log_alpha = hmm_filter(log_alpha, log_transmat, means, variances, returns[1:])
+        return model, log_transmat, means, variances, log_alpha
+        
+    def _hmm_loop(self):
+        """Ajuster le HMM hors du chemin critique à chaque demande"""
+        while True:
+            self._hmm_event.wait()
+            if self._closed.is_set():
+                return
+            self._hmm_event.clear()
+            with self._hmm_lock:
+                request, self._hmm_request = self._hmm_request, None
+            if request is None:
+                continue
+                
+            returns, tick = request
+            try:
+                fitted = self._fit_hmm(returns)
+            except Exception as e:
+                print(f"Erreur lors de l'ajustement HMM: {str(e)}")
+                continue
+                
+            with self._hmm_lock:
+                self._hmm_ready = fitted + (tick,)
+                
+    def detect_regime(self, returns):
+        """Détecter le régime du marché en utilisant HMM
+        
+        Le modèle est ajusté en arrière-plan puis réajusté toutes les
+        `hmm_refit_s` secondes ; sur le chemin critique seul le dernier
+        rendement fait avancer la loi filtrée des états.
+        """
+        self._regime_ticks += 1
+        
+        # Demander un (ré)ajustement sur une copie de l'historique
+        if len(returns) >= 99 and time.monotonic() >= self._hmm_next_fit:
+            self._hmm_next_fit = time.monotonic() + self._hmm_refit_s
+            with self._hmm_lock:
+                self._hmm_request = (returns.copy(), self._regime_ticks)
+            self._hmm_event.set()
+            
+        # Relever sous le verrou un modèle prêt : un seul appel l'adopte
+        with self._hmm_lock:
+            ready, self._hmm_ready = self._hmm_ready, None
+            
+        if ready is not None:
+            # Adopter le nouveau modèle et rattraper les rendements arrivés
+            # pendant l'ajustement
+            model, log_transmat, means, variances, log_alpha, tick = ready
+            lag = min(self._regime_ticks - tick, len(returns))
+            if lag > 0:
+                log_alpha = hmm_filter(log_alpha, log_transmat, means, variances, returns[-lag:])
+            self.hmm_model = model
+            self._hmm_log_transmat = log_transmat
+            self._hmm_means = means
+            self._hmm_vars = variances
+            self._hmm_log_alpha = log_alpha
+        elif self.hmm_model is None:
+            return False
+        else:
+            # Avancer le filtre avec le dernier rendement uniquement
+            self._hmm_log_alpha = hmm_filter(
+                self._hmm_log_alpha, self._hmm_log_transmat, self._hmm_means, self._hmm_vars,
+                returns[-1:]
+            )
             
         # Prédire le régime
-        regime = self.hmm_model.predict(returns)
-        self.regime_history.append(regime[-1])
+        self.regime_history.append(int(np.argmax(self._hmm_log_alpha)))
         
         # Considérer le régime comme directionnel s'il est stable
         if len(self.regime_history) >= 10:
@@ -92,10 +694,24 @@ class QuantBackend:
             
         return False
         
-    def calculate_pca_signals(self, price_matrix):
-        """Calculer les signaux PCA pour plusieurs paires"""
+    def calculate_pca_signals(self, price_matrix, n_new=1):
+        """Calculer les signaux PCA pour plusieurs paires
+        
+        Le premier appel ajuste la PCA sur toute la matrice ; ensuite les
+        `n_new` dernières lignes sont accumulées et intégrées par lots de
+        `batch_size` via partial_fit.
+        """
+        price_matrix = np.asarray(price_matrix, dtype=float)
+        
         # Ajuster PCA
-        self.pca.fit(price_matrix)
+        if not self._pca_fitted:
+            self.pca.partial_fit(price_matrix)
+            self._pca_fitted = True
+        elif n_new > 0:
+            self._pca_pending.extend(price_matrix[-n_new:])
+            if len(self._pca_pending) >= self.pca.batch_size:
+                self.pca.partial_fit(np.array(self._pca_pending))
+                self._pca_pending = []
         
         # Obtenir les composantes principales
         components = self.pca.transform(price_matrix)
@@ -109,24 +725,116 @@ class QuantBackend:
             'explained_variance': self.pca.explained_variance_ratio_
         }
         
+    def _compile_forest(self):
+        """Extraire les arbres ajustés en tableaux SoA pour rf_proba"""
+        trees = [est.tree_ for est in self.rf_classifier.estimators_]
+        n_nodes = max(tree.node_count for tree in trees)
+        shape = (len(trees), n_nodes)
+        
+        self._rf_feats = np.zeros(shape, dtype=np.int64)
+        self._rf_thrs = np.zeros(shape)
+        self._rf_left = np.full(shape, -1, dtype=np.int64)
+        self._rf_right = np.full(shape, -1, dtype=np.int64)
+        self._rf_leaf_val = np.zeros(shape)
+        
+        for t, tree in enumerate(trees):
+            n = tree.node_count
+            value = tree.value[:, 0, :]
+            self._rf_feats[t, :n] = tree.feature
+            self._rf_thrs[t, :n] = tree.threshold
+            self._rf_left[t, :n] = tree.children_left
+            self._rf_right[t, :n] = tree.children_right
+            self._rf_leaf_val[t, :n] = value[:, 1] / value.sum(axis=1)
+            
+    def _fit_rf(self, X, y):
+        """Ajuster la forêt aléatoire et préparer ses tableaux pour rf_proba"""
+        self.rf_classifier.fit(X, y)
+        self._compile_forest()
+        self._rf_fitted = True
+        
+    def calculate_ml_probabilities(self, features):
+        """Calculer la probabilité ML pour un lot de vecteurs de caractéristiques"""
+        if len(features) == 0 or not self._rf_fitted:
+            return np.full(len(features), 0.5)
+            
+        # Les arbres sklearn comparent les caractéristiques en float32
+        X = np.ascontiguousarray(features, dtype=np.float32).reshape(len(features), -1)
+        return rf_proba(X, self._rf_feats, self._rf_thrs, self._rf_left,
+                        self._rf_right, self._rf_leaf_val)
+        
     def calculate_ml_probability(self, features):
         """Calculer la probabilité ML en utilisant Random Forest"""
-        if not hasattr(self.rf_classifier, 'classes_'):
+        if len(features) == 0:
             return 0.5
             
-        proba = self.rf_classifier.predict_proba(features.reshape(1, -1))
-        return proba[0][1]  # Probabilité de la classe positive
+        return self.calculate_ml_probabilities(features.reshape(1, -1))[0]  # Probabilité de la classe positive
+        
+    def calculate_hedge_ratio(self, pair1, pair2, n_new=1, key=None):
+        """Calculer le ratio de couverture dynamique
         
-    def calculate_hedge_ratio(self, pair1, pair2):
-        """Calculer le ratio de couverture dynamique"""
+        Les moments de la fenêtre sont calculés en entier au premier appel
+        pour `key`, puis glissés en O(1) lorsque la fenêtre a avancé d'un
+        seul échantillon (ancien dernier point en avant-dernière position,
+        ancien deuxième point en tête) : ajout du dernier point et retrait,
+        par Welford inverse, de celui qui sort de la fenêtre. Toute autre
+        évolution de la fenêtre repart d'un calcul complet, tout comme un
+        appel sur `_h_refresh` pour borner la dérive numérique.
+        """
         if len(pair1) < 2 or len(pair2) < 2:
             return 0.0
             
-        # Calculer la corrélation glissante
-        correlation = np.corrcoef(pair1, pair2)[0, 1]
-        
-        # Calculer le bêta
-        beta = np.cov(pair1, pair2)[0, 1] / np.var(pair2)
+        pair1 = np.asarray(pair1, dtype=float)
+        pair2 = np.asarray(pair2, dtype=float)
+        n = pair1.size
+        h = self._h.get(key)
+        if (h is not None and n_new == 1 and h['n'] == n and h['age'] < self._h_refresh
+                and h['tail1'] == pair1[-2] and h['tail2'] == pair2[-2]
+                and h['next1'] == pair1[0] and h['next2'] == pair2[0]):
+            # Retirer l'échantillon sorti de la fenêtre (Welford inverse)
+            x = h['head1']
+            y = h['head2']
+            m1 = h['m1'] - (x - h['m1']) / (n - 1)
+            m2 = h['m2'] - (y - h['m2']) / (n - 1)
+            h['v1'] -= (x - m1) * (x - h['m1'])
+            h['v2'] -= (y - m2) * (y - h['m2'])
+            h['c12'] -= (x - m1) * (y - h['m2'])
+            
+            # Ajouter le dernier échantillon (Welford)
+            x = float(pair1[-1])
+            y = float(pair2[-1])
+            d1 = x - m1
+            d2 = y - m2
+            h['m1'] = m1 + d1 / n
+            h['m2'] = m2 + d2 / n
+            h['v1'] += d1 * (x - h['m1'])
+            h['v2'] += d2 * (y - h['m2'])
+            h['c12'] += d1 * (y - h['m2'])
+            h['age'] += 1
+        elif h is None or n_new > 0:
+            # Calcul complet : sommes et produits scalaires BLAS sur la
+            # fenêtre, sans tableau intermédiaire
+            s1 = pair1.sum()
+            s2 = pair2.sum()
+            m1 = s1 / n
+            m2 = s2 / n
+            h = self._h[key] = {
+                'n': n, 'm1': m1, 'm2': m2,
+                'v1': max(pair1 @ pair1 - s1 * m1, 0.0),
+                'v2': max(pair2 @ pair2 - s2 * m2, 0.0),
+                'c12': pair1 @ pair2 - s1 * m2,
+                'age': 0
+            }
+        h['head1'], h['head2'] = float(pair1[0]), float(pair2[0])
+        h['next1'], h['next2'] = float(pair1[1]), float(pair2[1])
+        h['tail1'], h['tail2'] = float(pair1[-1]), float(pair2[-1])
+            
+        if h['v1'] <= 0 or h['v2'] <= 0:
+            correlation = beta = hedge_ratio = 0.0
+        else:
+            # Corrélation, bêta et ratio de couverture à partir des co-moments
+            correlation = h['c12'] / np.sqrt(h['v1'] * h['v2'])
+            beta = h['c12'] / h['v2']
+            hedge_ratio = beta * np.sqrt(h['v1'] / h['v2'])
         
         # Mettre à jour la matrice de corrélation
         if self.correlation_matrix is None:
@@ -137,73 +845,142 @@ class QuantBackend:
         return {
             'correlation': correlation,
             'beta': beta,
-            'hedge_ratio': beta * (np.std(pair1) / np.std(pair2))
+            'hedge_ratio': hedge_ratio
         }
         
-    def calculate_optimal_stop(self, position_data):
+    def calculate_optimal_stop(self, returns):
         """Calculer le temps d'arrêt optimal en utilisant HJB simplifié"""
-        if len(position_data) < 2:
+        if len(returns) < 1:
             return False
             
-        # Calculer les rendements et la volatilité
-        returns = np.diff(np.log(position_data))
-        volatility = np.std(returns)
-        
-        # Condition HJB simplifiée
-        expected_return = np.mean(returns)
         risk_aversion = 2.0  # Paramètre d'aversion au risque
         
-        # Condition d'arrêt optimal
-        stop_condition = expected_return - 0.5 * risk_aversion * volatility**2
+        # Condition d'arrêt optimal : moyenne - 0.5 * aversion * variance < 0
+        return hjb_stop(returns, risk_aversion)
         
-        return stop_condition < 0
+    def process_mt5_data(self, data):
+        """Traiter les données de MT5 et renvoyer les signaux de trading (JSON encodé)
         
-    def process_mt5_data(self, data_json):
-        """Traiter les données de MT5 et renvoyer les signaux de trading"""
+        Sûr depuis plusieurs threads : les paquets d'un même backend sont
+        traités l'un après l'autre.
+        """
+        with self._lock:
+            return self._process_mt5_data(data)
+            
+    def _process_mt5_data(self, data):
+        """Traiter un paquet ; appelé sous self._lock"""
         try:
-            data = json.loads(data_json)
+            if isinstance(data, (bytes, bytearray, str)):
+                data = orjson.loads(data)
             
-            # Extraire les données de prix
-            prices = np.array(data['prices'])
-            volumes = np.array(data['volumes'])
+            missing = [key for key in ('symbol', 'time', 'prices', 'volumes') if key not in data]
+            if missing:
+                raise ValueError(f"Champs manquants : {', '.join(missing)}")
+            symbol = data['symbol']
+            
+            # Même barre et fenêtres identiques au paquet précédent à leurs
+            # deux extrémités : tous les signaux sont déterministes, la réponse
+            # précédente reste valable
+            input_key = (symbol, data['time']) + tuple(
+                (len(data[key]), data[key][0], data[key][-1]) if key in data else None
+                for key in ('prices', 'volumes', 'pair1_prices', 'pair2_prices')
+            )
+            if input_key == self._last_input_key:
+                return self._last_response
+                
+            # Mettre à jour l'historique du symbole
+            n = len(data['prices'])
+            history, resynced = self._update_history(symbol, data['prices'], data['volumes'])
+            prices = history.recent(n)
+            volumes = history.recent_volumes(n)
+            returns = history.recent_returns(n - 1)
+            
+            # Historique (re)construit : rejouer la fenêtre dans le filtre de
+            # Kalman depuis son état initial et réajuster le HMM dessus
+            if resynced:
+                self.reset_kalman_filter()
+                self.calculate_zscore_batch(prices[:-1])
+                self._hmm_next_fit = 0.0
             
             # Calculer les signaux
             zscore = self.calculate_zscore(prices[-1])
-            regime = self.detect_regime(prices)
-            
-            # Calculer la probabilité ML
-            features = np.column_stack((
-                prices[-20:],
-                volumes[-20:],
-                np.diff(prices[-20:])
-            ))
+            regime = self.detect_regime(returns)
+            
+            # Calculer la probabilité ML (prix, volumes, variations) dans un
+            # tampon réutilisé
+            features = self._feature_scratch
+            np.copyto(features[:, 0], prices[-20:])
+            np.copyto(features[:, 1], volumes[-20:])
+            np.subtract(prices[-20:], prices[-21:-1], out=features[:, 2])
             ml_prob = self.calculate_ml_probability(features)
             
-            # Calculer les signaux de couverture
-            hedge_data = self.calculate_hedge_ratio(
-                data.get('pair1_prices', prices),
-                data.get('pair2_prices', prices)
-            )
+            # Historique des paires, partagé avec le rafraîchissement de la cointégration
+            pair1 = pair2 = prices
+            pair_key = (symbol, symbol)
+            pairs_resynced = resynced
+            has_pairs = 'pair1_prices' in data and 'pair2_prices' in data
+            if has_pairs:
+                pair_key = ('pair1', 'pair2')
+                with self._coint_lock:
+                    history1, resynced1 = self._update_history('pair1', data['pair1_prices'])
+                    history2, resynced2 = self._update_history('pair2', data['pair2_prices'])
+                    pair1 = history1.recent(len(data['pair1_prices']))
+                    pair2 = history2.recent(len(data['pair2_prices']))
+                    if self._coint_thread is None:
+                        self._coint_thread = threading.Thread(target=self._cointegration_loop, daemon=True)
+                        self._coint_thread.start()
+                pairs_resynced = resynced1 or resynced2
+                
+            # Calculer les signaux de couverture ; après reconstruction d'un
+            # historique, la fenêtre n'a pas glissé d'un seul point
+            if pairs_resynced:
+                self._h.pop(pair_key, None)
+            hedge_data = self.calculate_hedge_ratio(pair1, pair2, key=pair_key)
             
             # Calculer l'arrêt optimal
-            stop_signal = self.calculate_optimal_stop(prices)
+            stop_signal = self.calculate_optimal_stop(returns)
             
             # Préparer la réponse
-            response = {
-                'zScore': float(zscore),
-                'isDirectionalRegime': bool(regime),
-                'mlProbability': float(ml_prob),
-                'kalmanSignal': bool(abs(zscore) > 2.0),
-                'hedgeSignal': bool(hedge_data['correlation'] > 0.7),
-                'correlation': float(hedge_data['correlation']),
-                'optimalStopSignal': bool(stop_signal)
-            }
+            correlation = hedge_data['correlation']
+            if math.isfinite(zscore) and math.isfinite(ml_prob) and math.isfinite(correlation):
+                response = RESPONSE_TEMPLATE % (
+                    zscore,
+                    JSON_BOOL[bool(regime)],
+                    ml_prob,
+                    JSON_BOOL[bool(abs(zscore) > 2.0)],
+                    JSON_BOOL[bool(correlation > 0.7)],
+                    correlation,
+                    JSON_BOOL[bool(stop_signal)]
+                )
+            else:
+                # Valeurs non finies : orjson les encode en null
+                response = orjson.dumps({
+                    'zScore': float(zscore),
+                    'isDirectionalRegime': bool(regime),
+                    'mlProbability': float(ml_prob),
+                    'kalmanSignal': bool(abs(zscore) > 2.0),
+                    'hedgeSignal': bool(correlation > 0.7),
+                    'correlation': float(correlation),
+                    'optimalStopSignal': bool(stop_signal)
+                })
+            
+            # Derniers tests de cointégration de la paire (null tant qu'aucun
+            # rafraîchissement n'a abouti)
+            if has_pairs:
+                coint = self.get_cointegration()
+                response = response[:-1] + b',' + orjson.dumps({
+                    'adfPValue': float(coint['adf_pvalue']),
+                    'johansenTrace': float(coint['johansen_trace']),
+                    'johansenMaxEig': float(coint['johansen_max_eig'])
+                })[1:]
             
-            return json.dumps(response)
+            self._last_input_key = input_key
+            self._last_response = response
+            return self._last_response
             
         except Exception as e:
             print(f"Erreur lors du traitement des données: {str(e)}")
-            return json.dumps({
+            return orjson.dumps({
                 'error': str(e)
             })
 
@@ -211,42 +988,128 @@ class MT5Server:
     def __init__(self, host='localhost', port=5555):
         self.host = host
         self.port = port
-        self.quant = QuantBackend()
         self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self.server_socket.bind((self.host, self.port))
         self.server_socket.listen(1)
         
+        # Un backend par symbole : filtres, régimes et historiques des
+        # différentes instances de l'EA ne se mélangent pas
+        self.backends = {}
+        
+        # Pool du test ADF, créé au premier test (voir _submit_adf)
+        self._adf_pool = None
+        self._adf_lock = threading.Lock()
+        
+        # Les calculs NumPy/sklearn relâchent le GIL ; chaque backend sérialise
+        # ses propres paquets, les symboles sont traités en parallèle
+        self._executor = ThreadPoolExecutor(max_workers=os.cpu_count())
+        
+    def backend(self, symbol):
+        """Backend d'un symbole, créé à son premier paquet (boucle asyncio uniquement)"""
+        backend = self.backends.get(symbol)
+        if backend is None:
+            backend = self.backends[symbol] = QuantBackend(adf_submit=self._submit_adf)
+        return backend
+        
+    def _submit_adf(self, fn, *args):
+        """Soumettre un test ADF au pool de processus, créé à la première demande
+        
+        Le test s'exécute hors du GIL, en parallèle entre symboles : chaque
+        backend a au plus un test en cours, mais le pool est partagé par tous.
+        Avec 'spawn', les processus ne sont lancés qu'à la demande ; ce
+        contexte évite de dupliquer par fork un processus qui a déjà des
+        threads, mais réimporte le script principal dans le processus fils :
+        le serveur doit être démarré sous `if __name__ == "__main__":`.
+        """
+        with self._adf_lock:
+            if self._adf_pool is None:
+                self._adf_pool = ProcessPoolExecutor(
+                    max_workers=os.cpu_count(), mp_context=multiprocessing.get_context('spawn')
+                )
+            return self._adf_pool.submit(fn, *args)
+        
     def start(self):
+        # Compiler les noyaux Numba avant d'accepter des clients
+        warmup_jit()
+        
+        try:
+            asyncio.run(self.serve())
+        finally:
+            for backend in self.backends.values():
+                backend.close()
+            if self._adf_pool is not None:
+                self._adf_pool.shutdown(wait=False, cancel_futures=True)
+        
+    async def serve(self):
+        server = await asyncio.start_server(
+            self.handle_client, sock=self.server_socket, limit=MAX_MESSAGE_SIZE
+        )
         print(f"Serveur démarré sur {self.host}:{self.port}")
-        while True:
-            client_socket, address = self.server_socket.accept()
-            print(f"Connecté à {address}")
+        async with server:
+            await server.serve_forever()
             
-            # Gérer le client dans un thread séparé
-            client_thread = threading.Thread(
-                target=self.handle_client,
-                args=(client_socket,)
-            )
-            client_thread.start()
+    async def read_message(self, reader):
+        """Lire un message complet : trame binaire préfixée ou ligne JSON"""
+        try:
+            buf = await reader.readexactly(1)
+        except asyncio.IncompleteReadError:
+            return None
+            
+        if buf == FRAME_MAGIC[:1]:
+            # Trame binaire : la longueur est donnée par l'en-tête
+            buf += await reader.readexactly(FRAME_HEADER.size - 1)
+            n_prices, n_volumes, symbol, bar_time = decode_header(buf)
+            payload = await reader.readexactly(8 * (n_prices + n_volumes))
+            data = decode_payload(payload, n_prices, n_volumes)
+            data.update(symbol=symbol, time=bar_time)
+            return data
             
-    def handle_client(self, client_socket):
+        # JSON : lire jusqu'au '\n' ; un dernier document sans délimiteur est
+        # accepté à la fermeture de la connexion
+        try:
+            buf += await reader.readuntil(b'\n')
+        except asyncio.IncompleteReadError as e:
+            buf += e.partial
+        return orjson.loads(buf)
+                
+    async def handle_client(self, reader, writer):
+        print(f"Connecté à {writer.get_extra_info('peername')}")
+        loop = asyncio.get_running_loop()
         try:
             while True:
-                # Recevoir les données de MT5
-                data = client_socket.recv(4096)
-                if not data:
+                # Recevoir les données de MT5 ; une ligne JSON invalide est
+                # consommée, elle reçoit une réponse d'erreur
+                error = None
+                try:
+                    data = await self.read_message(reader)
+                except orjson.JSONDecodeError as e:
+                    data, error = {}, str(e)
+                if data is None:
                     break
                     
-                # Traiter les données et obtenir les signaux
-                response = self.quant.process_mt5_data(data.decode())
+                if error is None and not isinstance(data, dict):
+                    error = "Le paquet doit être un objet JSON"
+                elif error is None and 'symbol' not in data:
+                    error = "Champs manquants : symbol"
+                    
+                # Traiter les données et obtenir les signaux dans le pool, avec
+                # le backend du symbole
+                if error is None:
+                    response = await loop.run_in_executor(
+                        self._executor, self.backend(data['symbol']).process_mt5_data, data
+                    )
+                else:
+                    print(f"Erreur lors du traitement des données: {error}")
+                    response = orjson.dumps({'error': error})
                 
                 # Envoyer la réponse à MT5
-                client_socket.send(response.encode())
+                writer.write(response)
+                await writer.drain()
                 
         except Exception as e:
             print(f"Erreur lors de la gestion du client: {str(e)}")
         finally:
-            client_socket.close()
+            writer.close()
 
 if __name__ == "__main__":
     server = MT5Server()